@@ -1,10 +1,16 @@
+import asyncio
 import uuid
 
 from langchain.agents import create_agent
+from langchain.agents.middleware import AgentMiddleware, ModelRequest
+from langgraph.checkpoint.memory import InMemorySaver
 from utils.model import model
-from utils.tools import tools
+from utils.db import close_db_pool
+from utils.tools import tools, close_maps_client
 
 
+# Sent ahead of every conversation together with the tool schemas. Keep it static (no per-request
+# interpolation) so the prompt prefix stays byte-identical and provider-side prefix caching can hit.
 system_prompt = """You are a helpful classroom finder assistant for Dartmouth College.
 
 Your goal is to help professors find the best classroom for their teaching needs.
@@ -28,60 +34,93 @@ IMPORTANT rules for presenting classroom results:
 - Never list classrooms in a table, bullet list, or any other text format. The UI handles that.
 
 IMPORTANT rules for location/distance tools:
-- When using validate_address or get_distance, always use full building names with "Hanover, NH 03755" (e.g. "Cummings Hall, Hanover, NH 03755").
+- When using validate_address, get_distance or get_distance_batch, always use full building names with "Hanover, NH 03755" (e.g. "Cummings Hall, Hanover, NH 03755").
 - If a location lookup fails, do NOT keep retrying with different name variations. After at most 2 attempts, tell the user the address could not be found and ask them to provide a street address.
 - Never make more than 3 total tool calls for a single address lookup.
+- sort_classrooms_by_distance checks the origin itself, so do not call validate_address on the origin before sorting.
+- To compare several origins or destinations, use one get_distance_batch call instead of many get_distance calls.
+- When several lookups don't depend on each other, request them together in one step so they run at the same time.
 """
 
-workflow = create_agent(
-    model,
-    tools=tools,
-    system_prompt=system_prompt,
-)
+class ParallelToolCalls(AgentMiddleware):
+    """
+    Let the model return several tool calls in one step. The agent already dispatches
+    each call of a step concurrently, so independent lookups overlap instead of queueing.
+    """
 
-def chat():
+    def _with_parallel_calls(self, request: ModelRequest) -> ModelRequest:
+        return request.override(model_settings={**request.model_settings, "parallel_tool_calls": True})
+
+    def wrap_model_call(self, request, handler):
+        return handler(self._with_parallel_calls(request))
+
+    async def awrap_model_call(self, request, handler):
+        return await handler(self._with_parallel_calls(request))
+
+def build_workflow(checkpointer=None):
+    """Compile the agent graph, optionally with a checkpointer that keeps thread state between turns."""
+    return create_agent(
+        model,
+        tools=tools,
+        system_prompt=system_prompt,
+        middleware=[ParallelToolCalls()],
+        checkpointer=checkpointer,
+    )
+
+# The LangGraph dev server provides its own persistence, so this graph has no checkpointer
+workflow = build_workflow()
+
+async def chat():
     thread_id = str(uuid.uuid4())
+    chat_workflow = build_workflow(checkpointer=InMemorySaver())
+    seen = 0
     print("Classroom Finder Agent - Type 'quit' or 'exit' to end\n")
-    while True:
-        user_input = input("User: ").strip()
-
-        if user_input.lower() in ['quit', 'exit']:
-            print("Ending chat session.")
-            break
-
-        if not user_input:
-            continue
-
-        try:
-            response = workflow.invoke(
-                {"messages": [{"role": "user", "content": user_input}]},
-                config={"configurable": {"thread_id": thread_id}}
-            )
-
-            # Extract and print the agent's response
-            if response and "messages" in response:
-                # Log tool calls and tool results
-                for msg in response["messages"]:
-                    if hasattr(msg, "tool_calls") and msg.tool_calls:
-                        for tc in msg.tool_calls:
-                            print(f"\n--- TOOL CALL ---")
-                            print(f"  Tool: {tc['name']}")
-                            print(f"  Input: {tc['args']}")
-                    if msg.type == "tool":
-                        print(f"--- TOOL RESULT ---")
-                        print(f"  Tool: {msg.name}")
-                        print(f"  Output: {msg.content}")
-                        print(f"-----------------")
-
-                last_message = response["messages"][-1]
-                print(f"\nAgent: {last_message.content}\n")
-            else:
-                print("\nAgent: (No response)\n")
-
-        except Exception as e:
-            print(f"\nError: {e}\n")
+    try:
+        while True:
+            # Read on a worker thread so the event loop keeps running while waiting for the user
+            user_input = (await asyncio.to_thread(input, "User: ")).strip()
+
+            if user_input.lower() in ['quit', 'exit']:
+                print("Ending chat session.")
+                break
+
+            if not user_input:
+                continue
+
+            try:
+                response = await chat_workflow.ainvoke(
+                    {"messages": [{"role": "user", "content": user_input}]},
+                    config={"configurable": {"thread_id": thread_id}}
+                )
+
+                # Extract and print the agent's response
+                if response and "messages" in response:
+                    # Log tool calls and tool results from this turn only
+                    for msg in response["messages"][seen:]:
+                        if hasattr(msg, "tool_calls") and msg.tool_calls:
+                            for tc in msg.tool_calls:
+                                print(f"\n--- TOOL CALL ---")
+                                print(f"  Tool: {tc['name']}")
+                                print(f"  Input: {tc['args']}")
+                        if msg.type == "tool":
+                            print(f"--- TOOL RESULT ---")
+                            print(f"  Tool: {msg.name}")
+                            print(f"  Output: {msg.content}")
+                            print(f"-----------------")
+
+                    seen = len(response["messages"])
+                    last_message = response["messages"][-1]
+                    print(f"\nAgent: {last_message.content}\n")
+                else:
+                    print("\nAgent: (No response)\n")
+
+            except Exception as e:
+                print(f"\nError: {e}\n")
+    finally:
+        await close_maps_client()
+        await close_db_pool()
 
 
 if __name__ == "__main__":
-    chat()
+    asyncio.run(chat())
 
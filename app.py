@@ -1,14 +1,40 @@
 from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Optional, Dict, Any, Tuple
+from cachetools import TTLCache
+from collections import OrderedDict
+import hashlib
+import json
+import logging
 import os
+import time
 from dotenv import load_dotenv
-from agent import workflow
-import uuid
+from langgraph.checkpoint.memory import InMemorySaver
+from agent import build_workflow
+from utils.db import open_db_pool, close_db_pool
+from utils.tools import close_maps_client
 
 load_dotenv()
 
+# DEBUG adds a per-message trace of every agent turn; formatting is skipped at higher levels
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
+# Cache of finished responses keyed by caller + normalized conversation
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+response_cache: TTLCache = TTLCache(maxsize=1024, ttl=RESPONSE_CACHE_TTL)
+
+# Keep each thread's messages between turns so follow-ups only send the new message
+workflow = build_workflow(checkpointer=InMemorySaver())
+
+# InMemorySaver never forgets a thread, so threads idle for longer than the response cache
+# keeps answers, or beyond the most recent MAX_THREADS, are deleted. Swap in a persistent
+# saver to keep conversations across restarts or workers.
+MAX_THREADS = int(os.getenv("MAX_THREADS", "1000"))
+_thread_last_used: "OrderedDict[str, float]" = OrderedDict()
+
 app = FastAPI(title="Classroom Finder Agent")
 
 # CORS middleware
@@ -27,11 +53,151 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[Message]
+    threadId: Optional[str] = None
 
 class ChatResponse(BaseModel):
     message: str
     classrooms: Optional[List[Dict[str, Any]]] = None
     toolCalled: bool = False
+    threadId: Optional[str] = None
+
+def _response_cache_key(authorization: str, request: ChatRequest) -> str:
+    """Hash the caller and the normalized conversation into a cache key."""
+    digest = hashlib.sha256(authorization.encode())
+    digest.update(f"\x00{request.threadId or ''}".encode())
+    for msg in request.messages:
+        # Collapse whitespace and case so trivially different retypes still hit
+        content = " ".join(msg.content.split()).casefold()
+        digest.update(f"\x00{msg.role}\x00{content}".encode())
+    return digest.hexdigest()
+
+def _thread_id(authorization: str, request: ChatRequest) -> str:
+    """
+    Use the client's thread ID, or derive a stable one from the caller and the
+    conversation's opening message so every turn of it lands on the same thread.
+    Conversations that open the same way share a thread; _prepare_turn notices when the
+    thread holds the other one's turns and replays the request instead.
+    """
+    if request.threadId:
+        return request.threadId
+    opening = request.messages[0].content if request.messages else ""
+    return hashlib.sha256(f"{authorization}\x00{opening}".encode()).hexdigest()[:32]
+
+def _unseen_messages(messages: List[Dict[str, str]], seen_user_contents: List[Any]) -> List[Dict[str, str]]:
+    """
+    Drop the leading turns that the thread's checkpoint already holds.
+    Empty unless the request's user messages start with exactly the checkpoint's and add a new one.
+    """
+    user_turns = 0
+    for i, msg in enumerate(messages):
+        if msg["role"] == "user":
+            if user_turns == len(seen_user_contents):
+                return messages[i:]
+            if msg["content"] != seen_user_contents[user_turns]:
+                return []
+            user_turns += 1
+    return []
+
+async def _touch_thread(thread_key: str):
+    """Mark a thread as used and delete threads that are idle too long or past MAX_THREADS."""
+    now = time.monotonic()
+    _thread_last_used[thread_key] = now
+    _thread_last_used.move_to_end(thread_key)
+    while _thread_last_used:
+        oldest, last_used = next(iter(_thread_last_used.items()))
+        if len(_thread_last_used) <= MAX_THREADS and now - last_used < RESPONSE_CACHE_TTL:
+            break
+        del _thread_last_used[oldest]
+        await workflow.checkpointer.adelete_thread(oldest)
+
+async def _prepare_turn(authorization: str, request: ChatRequest):
+    """
+    Resolve the request's thread and the messages the checkpointer hasn't seen yet.
+
+    Returns:
+        A tuple of (thread ID, run config, messages to send, number of messages already in the thread)
+    """
+    # Reuse the conversation's thread, scoped to the caller
+    thread_id = _thread_id(authorization, request)
+    caller = hashlib.sha256(authorization.encode()).hexdigest()[:16]
+    config = {"configurable": {"thread_id": f"{caller}:{thread_id}"}}
+    await _touch_thread(config["configurable"]["thread_id"])
+
+    # Convert messages to LangChain format
+    messages = [
+        {"role": msg.role, "content": msg.content} 
+        for msg in request.messages
+    ]
+
+    # Only send the turns the checkpointer hasn't seen yet
+    history = (await workflow.aget_state(config)).values.get("messages", [])
+    if history:
+        seen_user_contents = [msg.content for msg in history if msg.type == "human"]
+        unseen = _unseen_messages(messages, seen_user_contents)
+        if unseen:
+            messages = unseen
+        else:
+            # The thread holds a different or restarted conversation; replay this one from the request
+            await workflow.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+            history = []
+
+    return thread_id, config, messages, len(history)
+
+def _build_response(turn_messages: List[Any], thread_id: str) -> Tuple[ChatResponse, bool]:
+    """
+    Build the ChatResponse for the messages produced by one agent turn.
+
+    Returns:
+        A tuple of (response, whether a tool failed); a failed turn's answer shouldn't be cached
+    """
+    # One pass over this turn: note tool use, keep the latest classroom artifact,
+    # and only build the per-message debug output when DEBUG logging is on
+    debug = logger.isEnabledFor(logging.DEBUG)
+    tool_called = False
+    tool_failed = False
+    classrooms = None
+    if debug:
+        logger.debug("Total messages: %d", len(turn_messages))
+    for i, msg in enumerate(turn_messages):
+        tool_calls = getattr(msg, "tool_calls", None)
+        if tool_calls:
+            tool_called = True
+        if msg.type == "tool":
+            if msg.status == "error":
+                tool_failed = True
+            elif getattr(msg, "artifact", None):
+                classrooms = msg.artifact
+        if debug:
+            logger.debug("Message %d: type=%s", i, msg.type)
+            for tc in tool_calls or []:
+                logger.debug("  [TOOL CALL] %s(%s)", tc["name"], tc["args"])
+            if msg.type == "tool":
+                logger.debug("  [TOOL RESULT] name=%s content=%s", msg.name, msg.content[:300])
+                logger.debug("  [TOOL RESULT] artifact type=%s, value=%s", type(msg.artifact), msg.artifact)
+            if msg.type == "ai":
+                logger.debug("  [AI] content=%s", msg.content[:200])
+    if classrooms is not None:
+        logger.debug("Extracted %d classrooms from tool artifact", len(classrooms))
+
+    chat_response = ChatResponse(
+        message=turn_messages[-1].content,
+        classrooms=classrooms,
+        toolCalled=tool_called,
+        threadId=thread_id
+    )
+    return chat_response, tool_failed
+
+# Encodes classroom artifacts exactly like ChatResponse.classrooms, so UUIDs, Decimals and
+# datetimes look the same in the stream's classrooms event as in /chat and the done event
+_classrooms_adapter = TypeAdapter(List[Dict[str, Any]])
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event from JSON-compatible data."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_classrooms(classrooms: List[Dict[str, Any]]) -> str:
+    """Format the classrooms event for a query tool's artifact."""
+    return _sse("classrooms", {"classrooms": _classrooms_adapter.dump_python(classrooms, mode="json")})
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(
@@ -46,68 +212,95 @@ async def chat_endpoint(
         # Validate authorization header from backend
         if not authorization:
             raise HTTPException(status_code=401, detail="Authorization header required")
-        
-        # Generate unique thread ID for conversation
-        thread_id = str(uuid.uuid4())
-        
-        # Convert messages to LangChain format
-        messages = [
-            {"role": msg.role, "content": msg.content} 
-            for msg in request.messages
-        ]
+
+        # Serve repeated conversations without re-running the agent
+        cache_key = _response_cache_key(authorization, request)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        thread_id, config, messages, seen = await _prepare_turn(authorization, request)
         
         # Invoke agent workflow
-        response = workflow.invoke(
+        response = await workflow.ainvoke(
             {"messages": messages},
-            config={"configurable": {"thread_id": thread_id}}
+            config=config
         )
         
         # Extract response
         if response and "messages" in response:
-            last_message = response["messages"][-1]
-
-            # Log all messages for debugging
-            print(f"\n{'='*60}")
-            print(f"[DEBUG] Total messages: {len(response['messages'])}")
-            for i, msg in enumerate(response["messages"]):
-                print(f"\n[DEBUG] Message {i}: type={msg.type}")
-                if hasattr(msg, "tool_calls") and msg.tool_calls:
-                    for tc in msg.tool_calls:
-                        print(f"  [TOOL CALL] {tc['name']}({tc['args']})")
-                if msg.type == "tool":
-                    print(f"  [TOOL RESULT] name={msg.name}")
-                    print(f"  [TOOL RESULT] content={msg.content[:300]}")
-                    print(f"  [TOOL RESULT] artifact type={type(msg.artifact)}, value={msg.artifact}")
-                if msg.type == "ai":
-                    print(f"  [AI] content={msg.content[:200]}")
-            print(f"{'='*60}\n")
-
-            # Check if tool was called by inspecting message history
-            tool_called = any(
-                hasattr(msg, "tool_calls") and msg.tool_calls
-                for msg in response["messages"]
-            )
-
-            # Extract classroom data from tool message artifacts
-            classrooms = None
-            for msg in reversed(response["messages"]):
-                if msg.type == "tool" and hasattr(msg, "artifact") and msg.artifact:
-                    classrooms = msg.artifact
-                    print(f"[DEBUG] Extracted {len(classrooms)} classrooms from '{msg.name}' artifact")
-                    break
-            
-            return ChatResponse(
-                message=last_message.content,
-                classrooms=classrooms,
-                toolCalled=tool_called
-            )
+            # Messages produced by this turn; earlier ones came from the checkpoint
+            chat_response, tool_failed = _build_response(response["messages"][seen:], thread_id)
+            # Don't replay an outage's apology after the service recovers
+            if not tool_failed:
+                response_cache[cache_key] = chat_response
+            return chat_response
         else:
             raise HTTPException(status_code=500, detail="No response from agent")
             
     except Exception as e:
-        print(f"Error in chat endpoint: {e}")
+        logger.exception("Error in chat endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Streaming variant of /chat using server-sent events.
+    Emits `token` events as the model writes, a `classrooms` event when a query tool returns rooms,
+    and a final `done` event with the same fields as the /chat response (or `error` on failure).
+    """
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header required")
+
+    async def event_stream():
+        try:
+            cache_key = _response_cache_key(authorization, request)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                if cached.classrooms:
+                    yield _sse_classrooms(cached.classrooms)
+                yield _sse("done", cached.model_dump(mode="json"))
+                return
+
+            thread_id, config, messages, seen = await _prepare_turn(authorization, request)
+
+            async for msg, metadata in workflow.astream(
+                {"messages": messages},
+                config=config,
+                stream_mode="messages"
+            ):
+                if msg.type == "tool":
+                    if getattr(msg, "artifact", None):
+                        yield _sse_classrooms(msg.artifact)
+                elif isinstance(msg.content, str) and msg.content:
+                    yield _sse("token", {"content": msg.content})
+
+            state = await workflow.aget_state(config)
+            chat_response, tool_failed = _build_response(state.values["messages"][seen:], thread_id)
+            if not tool_failed:
+                response_cache[cache_key] = chat_response
+            yield _sse("done", chat_response.model_dump(mode="json"))
+
+        except Exception as e:
+            logger.exception("Error in chat stream endpoint: %s", e)
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.on_event("startup")
+async def startup():
+    """Open the database pool before the first request needs it."""
+    await open_db_pool()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled connections when the server stops."""
+    await close_maps_client()
+    await close_db_pool()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
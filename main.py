@@ -1,4 +1,6 @@
+import asyncio
+
 from agent import chat
 
 if __name__ == '__main__':
-    chat()
\ No newline at end of file
+    asyncio.run(chat())
\ No newline at end of file
@@ -0,0 +1,29 @@
+-- Indexes for the predicates built by query_classrooms_basic and
+-- query_classrooms_with_amenities in utils/tools.py.
+--
+-- The setup/amenity filters are written as `"col" IS NOT FALSE`, so the
+-- partial indexes use the same predicate; Postgres only picks a partial
+-- index when the query's WHERE clause implies the index's.
+
+CREATE INDEX IF NOT EXISTS idx_classroom_seat
+    ON "Classroom" ("seatCount");
+
+CREATE INDEX IF NOT EXISTS idx_classroom_seminar
+    ON "Classroom" ("seatCount") WHERE "seminarSetup" IS NOT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_classroom_lecture
+    ON "Classroom" ("seatCount") WHERE "lectureSetup" IS NOT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_classroom_group_learning
+    ON "Classroom" ("seatCount") WHERE "groupLearning" IS NOT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_classroom_white_board
+    ON "Classroom" ("seatCount") WHERE "whiteBoard" IS NOT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_classroom_ac
+    ON "Classroom" ("seatCount") WHERE "ac" IS NOT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_classroom_windows
+    ON "Classroom" ("seatCount") WHERE "windows" IS NOT FALSE;
+
+ANALYZE "Classroom";
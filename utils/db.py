@@ -1,8 +1,14 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional
+import asyncio
 import os
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from psycopg_pool import AsyncConnectionPool
+
+__all__ = ["get_db_connection", "open_db_pool", "close_db_pool"]
+
 # Load environment variables
 load_dotenv()
 
@@ -14,7 +20,59 @@ if not DATABASE_URL:
         "DATABASE_URL not found! Please set it in environment variables."
     )
 
+# Executions of the same query on a connection before psycopg prepares it server-side. Unset
+# disables prepared statements, which transaction-mode poolers (e.g. Supabase's) don't support.
+# The classroom tools render the same SQL for each filter combination, so each maps onto one plan.
+_prepare_threshold = os.getenv("DATABASE_PREPARE_THRESHOLD")
+_PREPARE_THRESHOLD = int(_prepare_threshold) if _prepare_threshold else None
+
+# Pool is opened on first use so importing the agent doesn't require a reachable database
+_pool: Optional["AsyncConnectionPool"] = None
+_pool_lock = asyncio.Lock()
+
+
+async def open_db_pool() -> "AsyncConnectionPool":
+    """Return the shared connection pool, opening it on first call."""
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            # Imported here so processes that never touch the database skip loading psycopg
+            from psycopg.rows import dict_row
+            from psycopg_pool import AsyncConnectionPool
+
+            # Sized for Supabase's pooler connection limits; connections are checked on
+            # checkout and recycled so dropped or idle-reaped ones aren't handed out
+            pool = AsyncConnectionPool(
+                DATABASE_URL,
+                min_size=2,
+                max_size=10,
+                timeout=30,
+                max_idle=1800,
+                max_lifetime=1800,
+                check=AsyncConnectionPool.check_connection,
+                kwargs={"row_factory": dict_row, "prepare_threshold": _PREPARE_THRESHOLD},
+                open=False,
+            )
+            await pool.open()
+            _pool = pool
+        return _pool
+
+
+@asynccontextmanager
+async def get_db_connection():
+    """
+    Borrow a pooled connection that returns rows as dicts.
+    The transaction is committed on success, rolled back on error, and the connection returned to the pool.
+    """
+    pool = await open_db_pool()
+    async with pool.connection() as conn:
+        yield conn
+
 
-def get_db_connection():
-    """Create a new database connection with RealDictCursor for dict-like row access."""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+async def close_db_pool():
+    """Close every pooled connection."""
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
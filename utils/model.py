@@ -1,6 +1,4 @@
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
-from langchain.agents.middleware import wrap_model_call, ModelRequest, ModelResponse
 from langchain_dartmouth.llms import ChatDartmouth
 
 import os
@@ -15,9 +13,11 @@ if not dartmouth_api_key:
     )
 
 
+# from langchain_openai import ChatOpenAI
+#
 # model = ChatOpenAI(
 #     model="gpt-5",
 #     api_key=dartmouth_chat_api_key
 # )
 
-model = ChatDartmouth(dartmouth_chat_api_key=dartmouth_api_key)
\ No newline at end of file
+model = ChatDartmouth(dartmouth_chat_api_key=dartmouth_api_key)
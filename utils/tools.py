@@ -1,19 +1,61 @@
-from langchain_core.tools import tool
+from langchain_core.tools import tool, ToolException
 from typing import Optional, List, Dict, Any, Tuple
+from cachetools import TTLCache
 from dotenv import load_dotenv
+from functools import lru_cache
 from utils.db import get_db_connection
+import asyncio
 import httpx
+import logging
 import os
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Environment variables
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:5000")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 DEFAULT_CAMPUS = "Dartmouth College, Hanover, NH"
+# Appended to bare building names so Google resolves them on campus
+_DEST_SUFFIX = ", " + DEFAULT_CAMPUS
+# Google Distance Matrix rejects requests with more than 25 origins, 25 destinations or 100 pairs
+MAX_ORIGINS_PER_REQUEST = 25
+MAX_DESTINATIONS_PER_REQUEST = 25
+MAX_ELEMENTS_PER_REQUEST = 100
+# Upper bound on the rows query_classrooms_basic will fetch when the agent asks for more
+MAX_BASIC_LIMIT = 50
+
+@lru_cache(maxsize=1)
+def _maps_client() -> httpx.AsyncClient:
+    """
+    Return the shared Google Maps client so calls reuse keep-alive connections instead of a new TLS handshake each.
+    Built on first use, so importing the tools (e.g. to load the graph) doesn't pay for the SSL context.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        # httpx's default Accept-Encoding already asks for compressed responses, including br since
+        # the brotli extra is installed, and decodes the large Distance Matrix bodies transparently
+    )
+
+# Campus buildings and user origins repeat across conversations, so remember Google's answers.
+# All tools are async and run on the event loop thread, so the caches need no locking.
+_GEOCODE_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=24 * 60 * 60)
+# Travel times shift with traffic and transit schedules, so distances expire sooner than geocodes
+_DISTANCE_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=60 * 60)
+# Lookups that failed deterministically (unknown address, origin or route) are remembered briefly
+# as ("ERR", reason) so agent retries don't burn API quota; transient API errors are not cached.
+# Keys: ("geocode", address), ("origin", origin) for unresolvable origins, and distance pair keys.
+_NEG_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=5 * 60)
+
+def _normalize_location(location: str) -> str:
+    """Normalize a location so spellings differing only in case or whitespace share cache entries."""
+    return " ".join(location.split()).lower()
 
 @tool
-def validate_address(address: str) -> Dict[str, Any]:
+async def validate_address(address: str) -> Dict[str, Any]:
     """
     Verify that an address exists and is correctly formatted.
     Use this to check user input before calculating distances.
@@ -32,38 +74,168 @@ def validate_address(address: str) -> Dict[str, Any]:
     if not GOOGLE_MAPS_API_KEY:
         return {"valid": False, "error": "Google Maps API key not configured"}
 
+    cache_key = _normalize_location(address)
+    cached = _GEOCODE_CACHE.get(cache_key)
+    if cached is not None:
+        return {**cached, "input": address}
+    failed = _NEG_CACHE.get(("geocode", cache_key))
+    if failed is not None:
+        return {"valid": False, "input": address, "error": failed[1]}
+
+
     try:
-        response = httpx.get(
+        response = await _maps_client().get(
             "https://maps.googleapis.com/maps/api/geocode/json",
             params={"address": address, "key": GOOGLE_MAPS_API_KEY},
-            timeout=10.0
         )
         data = response.json()
-        print(f"[DEBUG validate_address] Query: '{address}'")
-        print(f"[DEBUG validate_address] API status: {data.get('status')}")
-        print(f"[DEBUG validate_address] Error message: {data.get('error_message', 'none')}")
-        print(f"[DEBUG validate_address] Results count: {len(data.get('results', []))}")
+        logger.debug(
+            "validate_address query=%r status=%s error=%s results=%d",
+            address, data.get("status"), data.get("error_message", "none"), len(data.get("results", [])),
+        )
 
         if data["status"] != "OK" or not data.get("results"):
-            return {
-                "valid": False,
-                "input": address,
-                "error": f"Address not found. API status: {data.get('status')}. {data.get('error_message', '')}"
-            }
+            error = f"Address not found. API status: {data.get('status')}. {data.get('error_message', '')}"
+            # Only "no such address" is deterministic; quota, permission and server errors may pass on retry
+            if data.get("status") not in ("OK", "ZERO_RESULTS"):
+                raise ToolException(error)
+            _NEG_CACHE[("geocode", cache_key)] = ("ERR", error)
+            return {"valid": False, "input": address, "error": error}
 
         result = data["results"][0]
-        return {
+        validated = {
             "valid": True,
             "input": address,
             "formatted_address": result["formatted_address"],
             "location_type": result["geometry"]["location_type"]  # ROOFTOP, APPROXIMATE, etc.
         }
+        _GEOCODE_CACHE[cache_key] = validated
+        return validated
 
+    except ToolException:
+        raise
     except Exception as e:
-        return {"valid": False, "error": str(e)}
+        raise ToolException(f"Error validating address: {e}") from e
+
+async def _distance_matrix_request(
+    origins: List[str],
+    destinations: List[str],
+    mode: str,
+    timeout: float
+) -> Tuple[Optional[List[List[Dict[str, Any]]]], Optional[str]]:
+    """
+    Fetch Distance Matrix elements for every origin/destination pair in one request within Google's limits.
+
+    Returns:
+        A tuple of (one list of elements in destination order per origin, error message for the LLM);
+        rows is None on error
+    """
+    resp = await _maps_client().get(
+        "https://maps.googleapis.com/maps/api/distancematrix/json",
+        params={
+            "origins": "|".join(origins),
+            "destinations": "|".join(destinations),
+            "mode": mode,
+            "key": GOOGLE_MAPS_API_KEY
+        },
+        timeout=timeout
+    )
+    data = resp.json()
+
+    # A failed request (quota, permissions, server error) says nothing about the locations themselves
+    if data.get("status") != "OK":
+        raise ToolException(f"Could not find route. API status: {data.get('status')}. Try using a full street address.")
+
+    # Google leaves the resolved origin address empty when it cannot geocode the origin
+    for origin, resolved in zip(origins, data.get("origin_addresses", [])):
+        if not resolved:
+            error = f"Origin address '{origin}' could not be found. Ask the user for a street address."
+            _NEG_CACHE[("origin", _normalize_location(origin))] = ("ERR", error)
+            return (None, error)
+
+    rows = data.get("rows", [])
+    if len(rows) != len(origins) or not all(row.get("elements") for row in rows):
+        return (None, "Could not find route between these locations. Try using full street addresses instead of building names.")
+
+    return ([row["elements"] for row in rows], None)
+
+async def _fetch_distance_matrix(
+    origin: str,
+    destinations: List[str],
+    mode: str,
+    timeout: float
+) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """
+    Fetch Distance Matrix elements from one origin to each destination.
+    Destinations past Google's per-request limit are split into chunks fetched concurrently.
+
+    Returns:
+        A tuple of (elements in destination order, error message for the LLM); elements is None on error
+    """
+    chunks = [
+        destinations[i:i + MAX_DESTINATIONS_PER_REQUEST]
+        for i in range(0, len(destinations), MAX_DESTINATIONS_PER_REQUEST)
+    ]
+    results = await asyncio.gather(
+        *(_distance_matrix_request([origin], chunk, mode, timeout) for chunk in chunks)
+    )
+
+    elements = []
+    for rows, error in results:
+        if error:
+            return (None, error)
+        elements.extend(rows[0])
+    return (elements, None)
+
+def _cached_element(key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+    """Return the cached Distance Matrix element for an (origin, destination, mode) key, including recent failures."""
+    element = _DISTANCE_CACHE.get(key)
+    if element is None:
+        failed = _NEG_CACHE.get(key)
+        if failed is not None:
+            element = {"status": failed[1]}
+    return element
+
+def _cache_element(key: Tuple[str, str, str], element: Dict[str, Any]):
+    """Remember a fetched Distance Matrix element, keeping failures only briefly."""
+    if element["status"] == "OK":
+        _DISTANCE_CACHE[key] = element
+    else:
+        _NEG_CACHE[key] = ("ERR", element["status"])
+
+async def _distance_matrix(
+    origin: str,
+    destinations: List[str],
+    mode: str,
+    timeout: float = 10.0
+) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """
+    Get Distance Matrix elements from one origin to each destination, only requesting pairs not already cached.
+
+    Returns:
+        A tuple of (elements in destination order, error message for the LLM); elements is None on error
+    """
+    origin_key = _normalize_location(origin)
+    failed = _NEG_CACHE.get(("origin", origin_key))
+    if failed is not None:
+        return (None, failed[1])
+
+    keys = [(origin_key, _normalize_location(destination), mode) for destination in destinations]
+    elements = [_cached_element(key) for key in keys]
+
+    missing = [i for i, element in enumerate(elements) if element is None]
+    if missing:
+        fetched, error = await _fetch_distance_matrix(origin, [destinations[i] for i in missing], mode, timeout)
+        if error:
+            return (None, error)
+        for i, element in zip(missing, fetched):
+            elements[i] = element
+            _cache_element(keys[i], element)
+
+    return (elements, None)
 
 @tool
-def get_distance(origin: str, destination: str, mode: str = "walking") -> str:
+async def get_distance(origin: str, destination: str, mode: str = "walking") -> str:
     """
     Get travel distance and time between two locations.
 
@@ -80,37 +252,104 @@ def get_distance(origin: str, destination: str, mode: str = "walking") -> str:
         return "Error: Google Maps API key not configured"
 
     try:
-        resp = httpx.get(
-            "https://maps.googleapis.com/maps/api/distancematrix/json",
-            params={"origins": origin, "destinations": destination, "mode": mode, "key": GOOGLE_MAPS_API_KEY},
-            timeout=10.0
-        )
-        data = resp.json()
-
-        if data.get("status") != "OK":
-            return f"Could not find route. API status: {data.get('status')}. Try using a full street address."
+        elements, error = await _distance_matrix(origin, [destination], mode)
+        if error:
+            return error
 
-        rows = data.get("rows", [])
-        if not rows or not rows[0].get("elements"):
-            return "Could not find route between these locations. Try using full street addresses instead of building names."
-
-        elem = rows[0]["elements"][0]
+        elem = elements[0]
 
         if elem["status"] != "OK":
             return f"Could not find route between locations. Status: {elem['status']}. Try using full street addresses."
 
         return f"{elem['distance']['text']} ({elem['duration']['text']} {mode})"
+    except ToolException:
+        raise
     except Exception as e:
-        return f"Error: {e}"
+        raise ToolException(f"Error: {e}") from e
 
 @tool
-def sort_classrooms_by_distance(
+async def get_distance_batch(origins: List[str], destinations: List[str], mode: str = "walking") -> str:
+    """
+    Get travel distance and time from each of several origins to each of several destinations in one lookup.
+    Use this instead of repeated get_distance calls when comparing multiple locations.
+
+    IMPORTANT: Use full addresses with city/state (e.g. "Cummings Hall, Hanover, NH 03755"),
+    not abbreviations or short building names. If the result fails, ask the user for a street address
+    rather than retrying with variations.
+
+    Args:
+        origins: Starting addresses (use full addresses with city/state)
+        destinations: Ending addresses (use full addresses with city/state)
+        mode: "walking", "driving", "bicycling", or "transit"
+    """
+    if not GOOGLE_MAPS_API_KEY:
+        return "Error: Google Maps API key not configured"
+
+    if not origins or not destinations:
+        return "Provide at least one origin and one destination."
+
+    try:
+        origin_keys = [_normalize_location(origin) for origin in origins]
+        destination_keys = [_normalize_location(destination) for destination in destinations]
+        for origin_key in origin_keys:
+            failed = _NEG_CACHE.get(("origin", origin_key))
+            if failed is not None:
+                return failed[1]
+        matrix = [[_cached_element((o, d, mode)) for d in destination_keys] for o in origin_keys]
+
+        # Request only the origins and destinations that still have uncached pairs, in a single call
+        missing_rows = [i for i, row in enumerate(matrix) if None in row]
+        if missing_rows:
+            missing_cols = [
+                j for j in range(len(destinations))
+                if any(matrix[i][j] is None for i in missing_rows)
+            ]
+            if (
+                len(missing_rows) > MAX_ORIGINS_PER_REQUEST
+                or len(missing_cols) > MAX_DESTINATIONS_PER_REQUEST
+                or len(missing_rows) * len(missing_cols) > MAX_ELEMENTS_PER_REQUEST
+            ):
+                return (
+                    f"Too many locations for one lookup (at most {MAX_ORIGINS_PER_REQUEST} origins, "
+                    f"{MAX_DESTINATIONS_PER_REQUEST} destinations and {MAX_ELEMENTS_PER_REQUEST} pairs). "
+                    "Split them into smaller batches."
+                )
+
+            rows, error = await _distance_matrix_request(
+                [origins[i] for i in missing_rows],
+                [destinations[j] for j in missing_cols],
+                mode,
+                timeout=15.0
+            )
+            if error:
+                return error
+            for i, row in zip(missing_rows, rows):
+                for j, element in zip(missing_cols, row):
+                    matrix[i][j] = element
+                    _cache_element((origin_keys[i], destination_keys[j], mode), element)
+
+        lines = []
+        for origin, row in zip(origins, matrix):
+            for destination, elem in zip(destinations, row):
+                if elem["status"] == "OK":
+                    lines.append(f"- {origin} -> {destination}: {elem['distance']['text']} ({elem['duration']['text']} {mode})\n")
+                else:
+                    lines.append(f"- {origin} -> {destination}: no route found (status {elem['status']})\n")
+        return "".join(lines)
+    except ToolException:
+        raise
+    except Exception as e:
+        raise ToolException(f"Error: {e}") from e
+
+@tool
+async def sort_classrooms_by_distance(
     origin: str,
     classrooms: List[Dict[str, Any]],
     mode: str = "walking"
 ) -> str:
     """
     Sort classrooms by distance from an origin, closest first.
+    The origin does not need to be checked with validate_address first; an unknown origin is reported here.
 
     Args:
         origin: Starting address (e.g., "Baker Library, Hanover NH")
@@ -124,58 +363,149 @@ def sort_classrooms_by_distance(
         return "No classrooms to sort."
 
     try:
-        # Build addresses from building names
-        destinations = [f"{c.get('building', 'Unknown')}, {DEFAULT_CAMPUS}" for c in classrooms]
-
-        resp = httpx.get(
-            "https://maps.googleapis.com/maps/api/distancematrix/json",
-            params={
-                "origins": origin,
-                "destinations": "|".join(destinations),
-                "mode": mode,
-                "key": GOOGLE_MAPS_API_KEY
-            },
-            timeout=15.0
-        )
-        elements = resp.json()["rows"][0]["elements"]
+        # Rooms often share a building, so look up each building only once
+        buildings = list(dict.fromkeys(c.get('building') or 'Unknown' for c in classrooms))
+        destinations = [building + _DEST_SUFFIX for building in buildings]
 
-        # Pair classrooms with distances, filter failures
-        results = [
-            {**c, "dist": e["distance"]["value"], "dist_text": e["distance"]["text"], "time": e["duration"]["text"]}
-            for c, e in zip(classrooms, elements) if e["status"] == "OK"
-        ]
-        results.sort(key=lambda x: x["dist"])
+        # The origin is resolved by the same request, so no separate validate_address call is needed
+        elements, error = await _distance_matrix(origin, destinations, mode, timeout=15.0)
+        if error:
+            return error
 
-        # Format output same format as def query_classrooms_basic
-        result_text = f"Found {len(results)} classrooms:\n\n"
-        for c in results:
-            result_text += f"- {c['building']} {c['room']}: {c['seatCount']} seats ({c['dist_text']}, {c['time']} {mode})\n"
+        # Map each classroom back to its building's result
+        by_building = dict(zip(buildings, elements))
+        room_elements = [by_building[c.get('building') or 'Unknown'] for c in classrooms]
 
-        return result_text
+        # Rank reachable classrooms by index instead of copying every classroom dict
+        dists = [e["distance"]["value"] if e["status"] == "OK" else None for e in room_elements]
+        order = sorted((i for i, d in enumerate(dists) if d is not None), key=dists.__getitem__)
 
+        # Format output same format as def query_classrooms_basic
+        ranked = [(classrooms[i], room_elements[i]) for i in order]
+        lines = [
+            f"- {c['building']} {c['room']}: {c['seatCount']} seats ({e['distance']['text']}, {e['duration']['text']} {mode})\n"
+            for c, e in ranked
+        ]
+        return f"Found {len(order)} classrooms:\n\n" + "".join(lines)
+
+    except ToolException:
+        raise
     except Exception as e:
-        return f"Error: {e}"
+        raise ToolException(f"Error: {e}") from e
+
+def _format_classroom_lines(classrooms) -> str:
+    """Format one "- building room: N seats" line per classroom for the LLM."""
+    return "".join(
+        f"- {classroom['building']} {classroom['room']}: {classroom['seatCount']} seats\n"
+        for classroom in classrooms
+    )
+
+# Timestamp columns that need converting before rows can be sent as JSON
+_DT_KEYS = ("createdAt", "updatedAt")
 
 def _serialize_classrooms(classrooms) -> List[Dict[str, Any]]:
-    """Convert RealDictRow objects to JSON-serializable dicts."""
-    result = []
-    for row in classrooms:
-        classroom = dict(row)
-        # Convert datetime fields to ISO strings
-        for key in ("createdAt", "updatedAt"):
-            if key in classroom and classroom[key] is not None:
-                classroom[key] = classroom[key].isoformat()
-        result.append(classroom)
-    return result
+    """Convert datetime fields of dict rows to ISO strings in place so the rows are JSON-serializable."""
+    # Every row comes from the same SELECT, so the first one tells whether there is anything to convert
+    if not classrooms or not any(key in classrooms[0] for key in _DT_KEYS):
+        return classrooms
+    for classroom in classrooms:
+        for key in _DT_KEYS:
+            value = classroom.get(key)
+            if value is not None:
+                classroom[key] = value.isoformat()
+    return classrooms
+
+
+# Classroom data changes rarely and the basic query has few distinct inputs, so reuse its results
+_BASIC_QUERY_CACHE: TTLCache = TTLCache(maxsize=128, ttl=60 * 60)
+_UNFILTERED_AMENITY_CACHE: TTLCache = TTLCache(maxsize=1, ttl=5 * 60)
+
+# Columns both queries return. Their artifacts drive the same UI cards, so they share one shape:
+# identity, size, teaching style, timestamps and every amenity the tools can filter on.
+_CLASSROOM_COLUMNS = (
+    "id", "building", "room", "seatCount",
+    "seminarSetup", "lectureSetup", "groupLearning",
+) + _DT_KEYS + (
+    "projectionSurface", "computer", "microphone", "zoomRoom", "teachingStation",
+    "floorType", "furniture", "classroomCapture", "groupLearningScreens", "whiteBoard",
+    "chalkBoard", "dualBoardScreenUse", "groupLearningBoards", "windows", "ac", "filmScreening",
+)
+
+def _select(columns: Tuple[str, ...]) -> str:
+    """Build the SELECT clause for the given Classroom columns."""
+    return "SELECT " + ", ".join(f'"{column}"' for column in columns) + ' FROM "Classroom"'
+
+_CLASSROOM_SELECT = _select(_CLASSROOM_COLUMNS)
+# The agent often starts with an unfiltered basic search, so that SQL is built once
+_BASIC_NO_FILTER_SQL = _CLASSROOM_SELECT + " LIMIT %s"
+
+# Filters for the classroom queries as (tool argument, SQL condition) pairs.
+# Setup styles only narrow the search when requested; NULL means unknown, not excluded.
+_SETUP_FILTERS = tuple(
+    (arg, f'"{column}" IS NOT FALSE')
+    for arg, column in (
+        ("seminar_setup", "seminarSetup"),
+        ("lecture_setup", "lectureSetup"),
+        ("group_learning", "groupLearning"),
+    )
+)
+_STRING_FILTERS = tuple(
+    (arg, f'"{column}" = %s')
+    for arg, column in (
+        ("projection_surface", "projectionSurface"),
+        ("computer", "computer"),
+        ("microphone", "microphone"),
+        ("zoom_room", "zoomRoom"),
+        ("teaching_station", "teachingStation"),
+        ("floor_type", "floorType"),
+        ("furniture", "furniture"),
+    )
+)
+# Boolean amenities carry the condition for True (which includes NULLs) and for False
+_BOOLEAN_FILTERS = tuple(
+    (arg, f'"{column}" IS NOT FALSE', f'"{column}" = FALSE')
+    for arg, column in (
+        ("classroom_capture", "classroomCapture"),
+        ("group_learning_screens", "groupLearningScreens"),
+        ("white_board", "whiteBoard"),
+        ("chalk_board", "chalkBoard"),
+        ("dual_board_screen_use", "dualBoardScreenUse"),
+        ("group_learning_boards", "groupLearningBoards"),
+        ("windows", "windows"),
+        ("ac", "ac"),
+        ("film_screening", "filmScreening"),
+    )
+)
+
+
+def _essential_conditions(filters: Dict[str, Any]) -> Optional[Tuple[List[str], List[Any]]]:
+    """
+    Build the teaching-style and class-size conditions shared by both classroom queries.
+
+    Returns:
+        A tuple of (SQL conditions, their parameters), or None when no classroom can match
+    """
+    conditions = [condition for arg, condition in _SETUP_FILTERS if filters[arg]]
+    params = []
+    class_size = filters["class_size"]
+    if class_size:
+        min_seats, max_seats = max(1, class_size - 5), class_size + 10
+        # A nonsensical size leaves an empty seat range, so there is nothing to ask the database
+        if min_seats > max_seats:
+            return None
+        conditions.append('"seatCount" BETWEEN %s AND %s')
+        params.extend([min_seats, max_seats])
+    return conditions, params
 
 
 @tool(response_format="content_and_artifact")
-def query_classrooms_basic(
+async def query_classrooms_basic(
     seminar_setup: bool = False,
     lecture_setup: bool = False,
     group_learning: bool = False,
     class_size: Optional[int] = None,
-    department_name: Optional[str] = None
+    department_name: Optional[str] = None,
+    limit: int = 10
 ) -> Tuple[str, List[Dict[str, Any]]]:
     """
     Query classrooms based on essential criteria: class style (seminar, lecture, or group learning) and class size.
@@ -187,52 +517,54 @@ def query_classrooms_basic(
         group_learning: Whether the classroom should support group learning
         class_size: The expected class size (number of students)
         department_name: The department name for context (optional)
+        limit: Maximum number of classrooms to return (default 10, at most 50).
+            Ask for more only when you plan to sort the results by distance.
 
     Returns:
         A tuple of (formatted text for the LLM, list of classroom dicts)
     """
+    limit = max(1, min(limit, MAX_BASIC_LIMIT))
+
+    # department_name doesn't change the query, so it isn't part of the key
+    cache_key = (bool(seminar_setup), bool(lecture_setup), bool(group_learning), class_size or None, limit)
+    cached = _BASIC_QUERY_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
         # Build SQL query
-        conditions = []
-        params = []
-
-        # Use IS NOT FALSE to include NULL values (unknown = not excluded)
-        if seminar_setup:
-            conditions.append('"seminarSetup" IS NOT FALSE')
-        if lecture_setup:
-            conditions.append('"lectureSetup" IS NOT FALSE')
-        if group_learning:
-            conditions.append('"groupLearning" IS NOT FALSE')
-        if class_size:
-            conditions.append('"seatCount" >= %s AND "seatCount" <= %s')
-            params.extend([max(1, class_size - 5), class_size + 10])
-
-        query = 'SELECT * FROM "Classroom"'
+        essential = _essential_conditions(locals())
+        if essential is None:
+            return ("No classrooms found matching the basic criteria. Try adjusting the requirements.", [])
+        conditions, params = essential
+
         if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        query += " LIMIT 50"
+            query = _CLASSROOM_SELECT + " WHERE " + " AND ".join(conditions) + " LIMIT %s"
+        else:
+            query = _BASIC_NO_FILTER_SQL
+        params.append(limit)
 
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                classrooms = cur.fetchall()
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                classrooms = await cur.fetchall()
 
         if not classrooms:
-            return ("No classrooms found matching the basic criteria. Try adjusting the requirements.", [])
-
-        # Format results for LLM
-        result_text = f"Found {len(classrooms)} classrooms:\n\n"
-        for classroom in classrooms[:10]:  # Show top 10
-            result_text += f"- {classroom['building']} {classroom['room']}: {classroom['seatCount']} seats\n"
+            result = ("No classrooms found matching the basic criteria. Try adjusting the requirements.", [])
+        else:
+            # Format results for LLM
+            result_text = f"Found {len(classrooms)} classrooms:\n\n" + _format_classroom_lines(classrooms)
+            result = (result_text, _serialize_classrooms(classrooms))
 
-        return (result_text, _serialize_classrooms(classrooms[:10]))
+        _BASIC_QUERY_CACHE[cache_key] = result
+        return result
 
     except Exception as e:
-        return (f"Error querying classrooms: {str(e)}", [])
+        raise ToolException(f"Error querying classrooms: {e}") from e
 
 
 @tool(response_format="content_and_artifact")
-def query_classrooms_with_amenities(
+async def query_classrooms_with_amenities(
     seminar_setup: bool = False,
     lecture_setup: bool = False,
     group_learning: bool = False,
@@ -285,86 +617,66 @@ def query_classrooms_with_amenities(
     Returns:
         A tuple of (formatted text for the LLM, list of classroom dicts)
     """
+    # Tool arguments by name, looked up by the filter tables
+    filters = dict(locals())
+
     try:
         # Build SQL query
-        conditions = []
-        params = []
-
-        # Essential criteria — use IS NOT FALSE to include NULL values
-        if seminar_setup:
-            conditions.append('"seminarSetup" IS NOT FALSE')
-        if lecture_setup:
-            conditions.append('"lectureSetup" IS NOT FALSE')
-        if group_learning:
-            conditions.append('"groupLearning" IS NOT FALSE')
-        if class_size:
-            conditions.append('"seatCount" >= %s AND "seatCount" <= %s')
-            params.extend([max(1, class_size - 5), class_size + 10])
+        essential = _essential_conditions(filters)
+        if essential is None:
+            return ("No classrooms found matching all the specified amenities. Consider relaxing some requirements.", [])
+        conditions, params = essential
 
         # Amenities - string fields
-        if projection_surface:
-            conditions.append('"projectionSurface" = %s')
-            params.append(projection_surface)
-        if computer:
-            conditions.append('"computer" = %s')
-            params.append(computer)
-        if microphone:
-            conditions.append('"microphone" = %s')
-            params.append(microphone)
-        if zoom_room:
-            conditions.append('"zoomRoom" = %s')
-            params.append(zoom_room)
-        if teaching_station:
-            conditions.append('"teachingStation" = %s')
-            params.append(teaching_station)
-        if floor_type:
-            conditions.append('"floorType" = %s')
-            params.append(floor_type)
-        if furniture:
-            conditions.append('"furniture" = %s')
-            params.append(furniture)
+        for arg, condition in _STRING_FILTERS:
+            if filters[arg]:
+                conditions.append(condition)
+                params.append(filters[arg])
 
         # Amenities - boolean fields (IS NOT FALSE includes NULLs)
-        if classroom_capture is not None:
-            conditions.append('"classroomCapture" IS NOT FALSE' if classroom_capture else '"classroomCapture" = FALSE')
-        if group_learning_screens is not None:
-            conditions.append('"groupLearningScreens" IS NOT FALSE' if group_learning_screens else '"groupLearningScreens" = FALSE')
-        if white_board is not None:
-            conditions.append('"whiteBoard" IS NOT FALSE' if white_board else '"whiteBoard" = FALSE')
-        if chalk_board is not None:
-            conditions.append('"chalkBoard" IS NOT FALSE' if chalk_board else '"chalkBoard" = FALSE')
-        if dual_board_screen_use is not None:
-            conditions.append('"dualBoardScreenUse" IS NOT FALSE' if dual_board_screen_use else '"dualBoardScreenUse" = FALSE')
-        if group_learning_boards is not None:
-            conditions.append('"groupLearningBoards" IS NOT FALSE' if group_learning_boards else '"groupLearningBoards" = FALSE')
-        if windows is not None:
-            conditions.append('"windows" IS NOT FALSE' if windows else '"windows" = FALSE')
-        if ac is not None:
-            conditions.append('"ac" IS NOT FALSE' if ac else '"ac" = FALSE')
-        if film_screening is not None:
-            conditions.append('"filmScreening" IS NOT FALSE' if film_screening else '"filmScreening" = FALSE')
-
-        query = 'SELECT * FROM "Classroom"'
+        for arg, if_true, if_false in _BOOLEAN_FILTERS:
+            if filters[arg] is not None:
+                conditions.append(if_true if filters[arg] else if_false)
+
+        # Without filters the answer is the same for every caller, so reuse it briefly
+        if not conditions:
+            cached = _UNFILTERED_AMENITY_CACHE.get(None)
+            if cached is not None:
+                return cached
+
+        query = _CLASSROOM_SELECT
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
         query += " LIMIT 3"
 
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                classrooms = cur.fetchall()
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                classrooms = await cur.fetchall()
 
         if not classrooms:
-            return ("No classrooms found matching all the specified amenities. Consider relaxing some requirements.", [])
-
-        # Format detailed results
-        result_text = f"Found {len(classrooms)} classroom(s) with your amenities:\n\n"
-        for classroom in classrooms:
-            result_text += f"- {classroom['building']} {classroom['room']}: {classroom['seatCount']} seats\n"
+            result = ("No classrooms found matching all the specified amenities. Consider relaxing some requirements.", [])
+        else:
+            # Format detailed results
+            result_text = f"Found {len(classrooms)} classroom(s) with your amenities:\n\n" + _format_classroom_lines(classrooms)
+            result = (result_text, _serialize_classrooms(classrooms))
 
-        return (result_text, _serialize_classrooms(classrooms))
+        if not conditions:
+            _UNFILTERED_AMENITY_CACHE[None] = result
+        return result
 
     except Exception as e:
-        return (f"Error querying classrooms with amenities: {str(e)}", [])
+        raise ToolException(f"Error querying classrooms with amenities: {e}") from e
+
+async def close_maps_client():
+    """Close the shared Google Maps HTTP client if it was ever created."""
+    if _maps_client.cache_info().currsize:
+        await _maps_client().aclose()
+        _maps_client.cache_clear()
+
+tools = [validate_address, get_distance, get_distance_batch, sort_classrooms_by_distance, query_classrooms_basic, query_classrooms_with_amenities]
 
-tools = [validate_address, get_distance, sort_classrooms_by_distance, query_classrooms_basic, query_classrooms_with_amenities]
+# Tools raise ToolException for failures that may pass on retry (API outages, database errors).
+# The model still sees the message, but as an error ToolMessage, so the app knows not to cache the turn.
+for _tool in tools:
+    _tool.handle_tool_error = True